@@ -1,23 +1,80 @@
 import os
 import time
+import json
 import hashlib
 import logging
+import mmap
+import stat
 import tempfile
+import threading
 import asyncio
-import json
 import configparser
+import sqlite3
 import zipfile
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Union
-from telegram import Bot, InputFile
+from string import Template
+from types import ModuleType
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple, Type, cast
+from telegram import Bot, InputFile, Message
 from telegram.constants import ParseMode
 from telegram.error import TelegramError, NetworkError
 from telegram.helpers import escape_markdown
-import pyzipper
+from telegram.request import HTTPXRequest
+import pyzipper  # type: ignore[import-untyped]
 import aiohttp
 from aiolimiter import AsyncLimiter
 from logging.handlers import RotatingFileHandler
 
+# Optional accelerators, declared Optional so the fallbacks type-check (and compile with mypyc)
+blake3: Optional[Type[Any]]
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
+
+google_crc32c: Optional[ModuleType]
+try:
+    import google_crc32c
+except ImportError:
+    google_crc32c = None
+
+orjson: Optional[ModuleType]
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # type: ignore[import-untyped]
+except ImportError:
+    msgpack = None
+
+isal_zlib: Optional[ModuleType]
+try:
+    from isal import isal_zlib
+except ImportError:
+    isal_zlib = None
+
+zstandard: Optional[ModuleType]
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+Observer: Optional[Any]
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+if isal_zlib is not None:
+    # Route the deflate and crc32 calls of zipfile, and of pyzipper's copy of it, through ISA-L
+    for zip_module in (zipfile, pyzipper.zipfile):
+        setattr(zip_module, 'zlib', isal_zlib)
+        setattr(zip_module, 'crc32', isal_zlib.crc32)
+
 # --- DISCLAIMER ---
 # This script is for academic and research purposes only.
 # The author does not endorse or encourage the use of this script in violation
@@ -27,7 +84,7 @@ from logging.handlers import RotatingFileHandler
 # --- Configuration ---
 config = configparser.ConfigParser()
 
-logging.basicConfig(encoding='utf-8')
+logging.basicConfig()
 
 config_file_path = 'config/config.ini'
 if not os.path.exists(config_file_path):
@@ -56,26 +113,102 @@ FORWARD_CHAT_ID = int(config['Telegram'].get('forward_chat_id', 0))
 ENABLE_FORWARD = config['Telegram'].getboolean('enable_forward', False)
 
 # General Settings
-FOLDERS_TO_MONITOR: List[str] = config['General']['folders_to_monitor'].split(',')
+# Stripped absolute paths of the comma-separated folders
+FOLDERS_TO_MONITOR: Tuple[str, ...] = tuple(
+    os.path.abspath(folder.strip()) for folder in config['General']['folders_to_monitor'].split(',') if folder.strip()
+)
 CHECK_INTERVAL: int = int(config['General']['check_interval'])
+RECONCILE_INTERVAL: int = 3600  # Full rescan period when filesystem events are available, to catch missed events
+EVENT_SETTLE_DELAY: float = 2.0  # Seconds a changed file must go without events, at the same size, before it is processed
 MAX_FILE_SIZE: int = 45 * 1024 * 1024  # 45 MB
+HASH_WINDOW_SIZE: int = 16 * 1024 * 1024  # 16 MB
 LOG_RETENTION_DAYS: int = int(config['General']['log_retention_days'])
-FILE_HISTORY_PATH: str = 'data/bot_file_history.json'
+FILE_HISTORY_PATH: str = 'data/bot_file_history.json'  # Legacy JSON history, imported into the database once
+FILE_HISTORY_DB_PATH: str = 'data/bot_file_history.db'
 FILE_SIZE_CACHE_PATH: str = 'data/file_size_cache.json'
 ENABLE_ENCRYPTION: bool = config['General'].getboolean('enable_encryption', False)
 ZIP_PASSWORD: str = config['General'].get('zip_password', '')
-ALLOWED_EXTENSIONS: set = set(config['General'].get('allowed_extensions', '').split(',')) if config['General'].get('allowed_extensions') else set()
+# Lowercased, dot-prefixed suffixes for str.endswith
+ALLOWED_EXTENSIONS: Tuple[str, ...] = tuple(
+    ext if ext.startswith('.') else '.' + ext
+    for ext in (e.strip().lower() for e in config['General'].get('allowed_extensions', '').split(','))
+    if ext
+)
 ENABLE_CACHE: bool = config['General'].getboolean('enable_cache', True)
 COMPRESSION_LEVEL: str = config['General'].get('compression_level', 'default').lower()
 DISABLE_LOGS: bool = config['General'].getboolean('disable_logs', False)
+HASH_ALGORITHM: str = config['General'].get('hash_algorithm', 'auto').strip().lower()
+if HASH_ALGORITHM == 'auto':
+    HASH_ALGO: str = 'blake3' if blake3 is not None else 'blake2b'
+else:
+    HASH_ALGO = HASH_ALGORITHM
+
+if COMPRESSION_LEVEL.isdigit():
+    ZIP_COMPRESSION: int = zipfile.ZIP_DEFLATED
+    zip_level = int(COMPRESSION_LEVEL)
+    ZIP_COMPRESSLEVEL: Optional[int] = min(zip_level, isal_zlib.ISAL_BEST_COMPRESSION) if isal_zlib is not None else zip_level
+elif COMPRESSION_LEVEL == 'fast' and isal_zlib is not None:
+    ZIP_COMPRESSION = zipfile.ZIP_DEFLATED
+    ZIP_COMPRESSLEVEL = isal_zlib.ISAL_BEST_SPEED
+else:
+    ZIP_COMPRESSION = zipfile.ZIP_DEFLATED if COMPRESSION_LEVEL == 'default' else zipfile.ZIP_STORED
+    ZIP_COMPRESSLEVEL = None
+ZIP_COPY_BUFFER_SIZE: int = 16 * 1024 * 1024  # 16 MB
+# Already-compressed formats, stored in the archive without compression
+INCOMPRESSIBLE_EXTENSIONS: Tuple[str, ...] = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp4', '.mkv', '.avi', '.mov',
+                                             '.webm', '.mp3', '.aac', '.ogg', '.flac', '.zip', '.7z', '.rar', '.gz',
+                                             '.tgz', '.bz2', '.xz', '.zst', '.docx', '.xlsx', '.pptx', '.pdf')
+ZSTD_LEVEL: int = 3
+ZSTD_IO_SIZE: int = 1024 * 1024  # 1 MB
+ARCHIVE_SUFFIX: str = '.zst' if COMPRESSION_LEVEL == 'zstd' else '.zip'
 
 # --- Configuration Validation ---
+if COMPRESSION_LEVEL not in ('default', 'fast', 'store', 'zstd', 'none') and not (COMPRESSION_LEVEL.isdigit() and int(COMPRESSION_LEVEL) <= 9):
+    raise ValueError("Error: compression_level must be 'default', 'fast', 'store', 'zstd', 'none' or an integer from 0 to 9.")
+
+if HASH_ALGORITHM not in ('auto', 'blake3', 'blake2b', 'md5', 'crc32c'):
+    raise ValueError("Error: hash_algorithm must be 'auto', 'blake3', 'blake2b', 'md5' or 'crc32c'.")
+
+if HASH_ALGO == 'blake3' and blake3 is None:
+    raise ValueError("Error: hash_algorithm 'blake3' requires the blake3 package.")
+
+if HASH_ALGO == 'crc32c' and google_crc32c is None:
+    raise ValueError("Error: hash_algorithm 'crc32c' requires the google-crc32c package.")
+
+if COMPRESSION_LEVEL == 'zstd' and zstandard is None:
+    raise ValueError("Error: compression_level 'zstd' requires the zstandard package.")
+
+if ENABLE_ENCRYPTION and COMPRESSION_LEVEL == 'zstd':
+    raise ValueError("Error: Encryption requires ZIP archives and cannot be used with compression_level 'zstd'.")
+
 if ENABLE_ENCRYPTION and COMPRESSION_LEVEL == 'none':
     raise ValueError("Error: Encryption cannot be enabled when compression is set to 'none'.")
 
 if ENABLE_ENCRYPTION and not ZIP_PASSWORD:
     raise ValueError("Error: ZIP_PASSWORD must be set in the configuration file when encryption is enabled.")
 
+# --- Message Templates ---
+ENCRYPTION_STATUS: str = "🔒 Encrypted" if ENABLE_ENCRYPTION else "🔓 Not encrypted"
+if COMPRESSION_LEVEL == 'zstd':
+    ENCRYPTION_NOTE: str = "The zstd file is not encrypted."
+    EXTRACT_STEP: str = "Decompress it with: zstd -d ${base_name}.zst"
+else:
+    ENCRYPTION_NOTE = "The ZIP file is encrypted. You'll need the password to extract it." if ENABLE_ENCRYPTION else "The ZIP file is not encrypted."
+    EXTRACT_STEP = "Extract ${base_name}.zip"
+REASSEMBLY_TEMPLATE = Template("""```
+To reassemble the file:
+1. Download all parts (${total_parts} in total)
+2. Use one of the following commands:
+   # Windows
+   copy /b ${base_name}""" + ARCHIVE_SUFFIX + """.* ${base_name}""" + ARCHIVE_SUFFIX + """
+
+   # Linux/Mac
+   cat ${base_name}""" + ARCHIVE_SUFFIX + """.* > ${base_name}""" + ARCHIVE_SUFFIX + """
+3. """ + EXTRACT_STEP + """
+
+""" + ENCRYPTION_NOTE + """
+```""")
+
 # --- Logging Configuration ---
 os.makedirs('logs', exist_ok=True)
 log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -98,11 +231,27 @@ console_handler.setFormatter(log_formatter)
 logger.addHandler(console_handler)
 
 # --- Global Variables ---
-bot = Bot(token=TOKEN)
-file_history: Dict[str, Dict[str, Union[str, bool, int, float]]] = {}
+MAX_CONCURRENT_FILES: int = 4  # Files uploaded at once
+bot = Bot(token=TOKEN, request=HTTPXRequest(connection_pool_size=2 * MAX_CONCURRENT_FILES))
+file_history: Dict[str, Dict[str, Any]] = {}  # Columns loaded from history_db may be None
+hash_index: Dict[str, str] = {}  # Maps each sent file hash to its path in file_history
+history_db: sqlite3.Connection  # Opened in main()
+history_db_lock = threading.Lock()  # Serializes the worker threads writing to history_db
+dirty_paths: Set[str] = set()  # Paths whose file_history entries have changes not yet written to history_db
+pending_hashes: Set[str] = set()  # Hashes of files currently being uploaded by concurrent process_file calls
+skipped_duplicates: Dict[str, Tuple[int, int]] = {}  # path -> (size, mtime_ns) of files skipped as copies of sent files
 file_counter: int = 0
 file_size_cache: Dict[str, int] = {}
 error_messages: Dict[str, int] = {}  # Store error message IDs
+zip_pool = ThreadPoolExecutor(max_workers=os.cpu_count())  # Runs compression and part I/O off the event loop
+hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count())  # Hashes files
+PART_QUEUE_SIZE: int = 2  # Split parts held in memory ahead of the upload, across all concurrent streams
+part_budget = threading.Condition()  # Guards queued_parts, notified whenever a queued part is released
+queued_parts: int = 0  # Parts emitted by all PartStreamWriters that have not been uploaded yet
+
+BACKEND_URL: str = 'http://localhost:5000'
+BACKEND_HEADERS: Dict[str, str] = {'Content-Type': 'application/msgpack' if msgpack is not None else 'application/json'}
+http_session: aiohttp.ClientSession  # Shared keep-alive session for backend requests, opened in main()
 
 # Rate limiters to respect Telegram API limits
 message_limiter = AsyncLimiter(30, 1)  # 30 messages per second
@@ -110,40 +259,203 @@ media_limiter = AsyncLimiter(20, 60)  # 20 media uploads per minute
 
 # --- Utility Functions ---
 
+def dumps_json(data: Any) -> bytes:
+    """Serializes data to JSON bytes with orjson, or the json module when orjson is not installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+def dumps_payload(data: Any) -> bytes:
+    """Serializes a backend request body with msgpack, or as JSON when msgpack is not installed."""
+    if msgpack is not None:
+        return msgpack.packb(data)
+    return dumps_json(data)
+
 def load_data(file_path: str) -> Dict:
     """Loads JSON data from a file."""
     os.makedirs('data', exist_ok=True)
     try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            return (orjson or json).loads(f.read())
     except FileNotFoundError:
         logger.warning(f"File not found: {file_path}. Creating a new file.")
         return {}
-    except json.JSONDecodeError:
+    except json.JSONDecodeError:  # orjson.JSONDecodeError is a subclass
         logger.error(f"Error decoding JSON from {file_path}. Creating a new file.")
         return {}
 
+def read_file(file_path: str) -> bytes:
+    """Reads a whole file into memory."""
+    with open(file_path, 'rb') as f:
+        return f.read()
+
 def save_data(data: Dict, file_path: str) -> None:
-    """Saves JSON data to a file."""
+    """Saves JSON data to a file atomically, so a crash mid-write never leaves a truncated file."""
     try:
-        with open(file_path, 'w') as f:
-            json.dump(data, f)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(dumps_json(data))
+        os.replace(tmp_path, file_path)
         logger.info(f"Data saved to {file_path}")
     except Exception as e:
         logger.error(f"Error saving data to {file_path}: {str(e)}")
 
-def calculate_md5(file_path: str) -> str:
-    """Calculates the MD5 hash of a file."""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+# Columns of the files table after the path primary key, in the order of INSERT values
+HISTORY_COLUMNS: Tuple[str, ...] = ('hash', 'hash_algo', 'last_sent', 'send_success', 'encrypted', 'encryption_algorithm',
+                                    'file_id', 'file_size', 'mtime_ns', 'processed_size', 'processing_time', 'upload_speed')
+HISTORY_BOOL_COLUMNS: Tuple[str, ...] = ('send_success', 'encrypted')
+
+def open_history_db(db_path: str) -> sqlite3.Connection:
+    """Opens the SQLite file history, creating the files and meta tables if needed."""
+    os.makedirs('data', exist_ok=True)
+    # Used from worker threads, serialized by history_db_lock
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY, hash TEXT, hash_algo TEXT, last_sent TEXT, send_success INTEGER, encrypted INTEGER,
+        encryption_algorithm TEXT, file_id INTEGER, file_size INTEGER, mtime_ns INTEGER, processed_size INTEGER,
+        processing_time REAL, upload_speed REAL)""")
+    connection.execute("DROP INDEX IF EXISTS idx_hash")  # Duplicates are looked up in hash_index, not the table
+    connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+    connection.commit()
+    return connection
+
+def load_history(connection: sqlite3.Connection) -> Dict:
+    """Loads every file history row into a dict keyed by path."""
+    history = {}
+    for path, *values in connection.execute(f"SELECT path, {', '.join(HISTORY_COLUMNS)} FROM files"):
+        entry = dict(zip(HISTORY_COLUMNS, values))
+        for column in HISTORY_BOOL_COLUMNS:
+            entry[column] = bool(entry[column])
+        history[path] = entry
+    return history
+
+class Crc32cHasher:
+    """hashlib-style wrapper around google_crc32c.Checksum, whose update() only accepts bytes."""
+
+    def __init__(self) -> None:
+        assert google_crc32c is not None  # hash_algorithm = crc32c is rejected at startup without it
+        self.checksum = google_crc32c.Checksum()
 
-async def send_file(file_path: str, caption: str, part_number: Optional[int] = None, total_parts: Optional[int] = None) -> bool:
-    """Sends a file to Telegram, handling rate limits and potential errors."""
+    def update(self, data: Any) -> None:
+        self.checksum.update(bytes(data))
+
+    def digest(self) -> bytes:
+        return self.checksum.digest()
+
+def new_hasher(algorithm: str) -> Any:
+    """Returns a hashlib-style object for a hash_algorithm other than blake3."""
+    if algorithm == 'crc32c':
+        return Crc32cHasher()
+    return hashlib.new(algorithm)
+
+def load_file_counter(connection: sqlite3.Connection) -> int:
+    """Returns the stored file counter, or the highest file_id for a database written before it was stored."""
+    row = connection.execute("SELECT value FROM meta WHERE key = 'file_counter'").fetchone()
+    if row is None:
+        row = connection.execute("SELECT COALESCE(MAX(file_id), 0) FROM files").fetchone()
+    return row[0]
+
+def update_from_file(hasher: Any, file_path: str) -> None:
+    """Feeds a file to hasher in HASH_WINDOW_SIZE blocks read into one reused buffer."""
+    with open(file_path, "rb", buffering=0) as f, memoryview(bytearray(HASH_WINDOW_SIZE)) as buffer:
+        while n := f.readinto(buffer):
+            with buffer[:n] as block:
+                hasher.update(block)
+
+def calculate_file_digest(file_path: str, algorithm: str) -> str:
+    """Calculates the digest of a file with a hashlib-style algorithm."""
+    hasher = new_hasher(algorithm)
+    update_from_file(hasher, file_path)
+    return hasher.digest().hex()
+
+def calculate_digest(file_path: str, algorithm: str = HASH_ALGO) -> str:
+    """Calculates the content hash of a file, by default with HASH_ALGO (multithreaded BLAKE3 when available, else BLAKE2b)."""
+    if algorithm == 'blake3' and blake3 is not None:
+        hasher = blake3(max_threads=blake3.AUTO)
+        update_from_file(hasher, file_path)
+        return hasher.hexdigest()
+    return calculate_file_digest(file_path, algorithm)
+
+def hash_algorithm_available(algorithm: str) -> bool:
+    """Returns True if files can be hashed with algorithm in this installation."""
+    if algorithm == 'blake3':
+        return blake3 is not None
+    if algorithm == 'crc32c':
+        return google_crc32c is not None
+    return algorithm in hashlib.algorithms_available
+
+def rehash_history_entry(file_path: str, file_data: Dict[str, Any]) -> bool:
+    """Rehashes a history entry with HASH_ALGO if the file still has its recorded hash, returning whether it did."""
+    algorithm = file_data.get('hash_algo') or 'md5'
+    if (not os.path.isfile(file_path) or not hash_algorithm_available(algorithm)
+            or calculate_digest(file_path, algorithm) != file_data['hash']):
+        return False
+    file_data['hash'] = calculate_digest(file_path)
+    file_data['hash_algo'] = HASH_ALGO
+    return True
+
+def absolutize_history_paths() -> None:
+    """Rekeys history entries recorded under relative monitored folders by their absolute path, keeping existing absolute ones."""
+    relative_paths = [file_path for file_path in file_history if not os.path.isabs(file_path)]
+    for file_path in relative_paths:
+        absolute_path = os.path.abspath(file_path)
+        file_history.setdefault(absolute_path, file_history.pop(file_path))
+        dirty_paths.update((file_path, absolute_path))
+    if relative_paths:
+        logger.info(f"Converted {len(relative_paths)} relative history paths to absolute paths")
+
+async def migrate_history_hashes() -> None:
+    """Rehashes history entries recorded with a different hash algorithm than HASH_ALGO, in hash_pool."""
+    loop = asyncio.get_running_loop()
+    stale = [(file_path, file_data) for file_path, file_data in file_history.items()
+             if (file_data.get('hash_algo') or 'md5') != HASH_ALGO]
+    results = await asyncio.gather(*(loop.run_in_executor(hash_pool, rehash_history_entry, file_path, file_data)
+                                     for file_path, file_data in stale), return_exceptions=True)
+    migrated = 0
+    for (file_path, _), result in zip(stale, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error rehashing file {file_path}: {str(result)}")
+        elif result:
+            dirty_paths.add(file_path)
+            migrated += 1
+    if migrated:
+        logger.info(f"Rehashed {migrated} history entries with {HASH_ALGO}")
+    if migrated < len(stale):
+        logger.info(f"Kept the old hash of {len(stale) - migrated} history entries whose files are missing or changed")
+
+def write_history_rows(rows: List[Tuple], removed_paths: List[str], counter: int) -> None:
+    """Upserts rows into the files table of history_db, deletes removed_paths and stores the file counter, in one transaction."""
+    placeholders = ', '.join('?' * (len(HISTORY_COLUMNS) + 1))
+    with history_db_lock, history_db:
+        history_db.executemany(f"INSERT OR REPLACE INTO files VALUES ({placeholders})", rows)
+        history_db.executemany("DELETE FROM files WHERE path = ?", [(file_path,) for file_path in removed_paths])
+        history_db.execute("INSERT OR REPLACE INTO meta VALUES ('file_counter', ?)", (counter,))
+
+async def flush_file_history() -> None:
+    """Writes the file_history entries changed or removed since the last flush to history_db from a worker thread."""
+    if not dirty_paths:
+        return
+    # The rows are snapshotted on the event loop, so entries can keep changing while the thread writes them
+    paths = list(dirty_paths)
+    dirty_paths.clear()
+    rows = [(file_path, *(file_history[file_path].get(column) for column in HISTORY_COLUMNS))
+            for file_path in paths if file_path in file_history]
+    removed_paths = [file_path for file_path in paths if file_path not in file_history]
+    try:
+        await asyncio.to_thread(write_history_rows, rows, removed_paths, file_counter)
+        logger.info(f"Saved {len(rows)} file history entries to {FILE_HISTORY_DB_PATH}")
+    except sqlite3.Error as e:
+        dirty_paths.update(paths)  # Retried on the next flush
+        logger.error(f"Error saving file history to {FILE_HISTORY_DB_PATH}: {str(e)}")
+
+async def send_file(file_path: str, caption: str, part_number: Optional[int] = None, total_parts: Optional[int] = None,
+                    content: Optional[bytes] = None) -> bool:
+    """Sends a file, or content under its name, to Telegram, handling rate limits and potential errors."""
     max_retries = 3
     retry_delay = 5
+    if content is None:
+        content = await asyncio.to_thread(read_file, file_path)
 
     for attempt in range(max_retries):
         try:
@@ -152,12 +464,13 @@ async def send_file(file_path: str, caption: str, part_number: Optional[int] = N
                 if part_number is not None and total_parts is not None:
                 # Escape the parentheses here
                  escaped_caption += f"\n\\(Part {part_number}/{total_parts}\\)"
+                elif part_number is not None:
+                    escaped_caption += f"\n\\(Part {part_number}\\)"
 
-                with open(file_path, 'rb') as file:
-                    message = await bot.send_document(chat_id=CHAT_ID, 
-                                                      document=InputFile(file),
-                                                      caption=escaped_caption, 
-                                                      parse_mode=ParseMode.MARKDOWN_V2)
+                message = await bot.send_document(chat_id=CHAT_ID,
+                                                  document=InputFile(content, filename=os.path.basename(file_path)),
+                                                  caption=escaped_caption,
+                                                  parse_mode=ParseMode.MARKDOWN_V2)
                 logger.info(f"File sent successfully: {file_path}")
 
                 if ENABLE_FORWARD:
@@ -187,7 +500,7 @@ async def send_file(file_path: str, caption: str, part_number: Optional[int] = N
     
     return False
 
-async def forward_message(message) -> None:
+async def forward_message(message: Message) -> None:
     """Forwards a message to the specified chat if enabled."""
     try:
         bot_user = await bot.get_me()
@@ -207,37 +520,41 @@ async def split_and_send_zip(file_path: str, skip_zip: bool = False) -> Tuple[bo
     try:
         base_name = os.path.basename(file_path)
         original_size = os.path.getsize(file_path)
+        compress = not skip_zip and COMPRESSION_LEVEL != 'none' and not file_path.lower().endswith('.zip')
         with tempfile.TemporaryDirectory() as temp_dir:
-            zip_path = await create_zip_archive(file_path, base_name, temp_dir, skip_zip)
+            zip_path = await create_zip_archive(file_path, base_name, temp_dir, compress)
 
             logger.info(f"Splitting file: {zip_path}")
             chunk_size = MAX_FILE_SIZE
             file_number = 1
-            total_parts = os.path.getsize(zip_path) // chunk_size + (1 if os.path.getsize(zip_path) % chunk_size else 0)
-
-            with open(zip_path, 'rb') as zip_file:
-                while True:
-                    chunk = zip_file.read(chunk_size)
-                    if not chunk:
-                        break
-
-                    chunk_name = os.path.join(temp_dir, f'{base_name}.{file_number:03d}')
-                    with open(chunk_name, 'wb') as chunk_file:
-                        chunk_file.write(chunk)
+            total_parts = -(-os.path.getsize(zip_path) // chunk_size)  # Ceiling division
 
+            loop = asyncio.get_running_loop()
+            part_queue: asyncio.Queue = asyncio.Queue()
+            writer = PartStreamWriter(loop, part_queue)
+            splitting = loop.run_in_executor(zip_pool, writer.split_file, zip_path)
+            try:
+                while (chunk := await part_queue.get()) is not None:
+                    chunk_name = f'{base_name}.{file_number:03d}'
                     logger.info(f"Sending part {file_number}/{total_parts}: {chunk_name}")
                     caption = f"Part {file_number} of {base_name}"
-                    success = await send_file(chunk_name, caption, part_number=file_number, total_parts=total_parts)
+                    success = await send_file(chunk_name, caption, part_number=file_number, total_parts=total_parts,
+                                              content=chunk)
+                    writer.part_sent()
                     if not success:
                         logger.error(f"Failed to send part {file_number} of {base_name}")
                         return False, 0
 
                     file_number += 1
                     file_counter += 1
+                await splitting  # Re-raise any error that ended the split early
+            finally:
+                writer.abort()
+                await asyncio.gather(splitting, return_exceptions=True)
 
             await send_reassembly_instructions(base_name, file_number)
 
-            if not skip_zip and COMPRESSION_LEVEL != 'none' and not file_path.lower().endswith('.zip'):
+            if compress:
                 os.remove(zip_path)
                 logger.debug(f"Deleted temporary zipped file: {zip_path}")
 
@@ -247,40 +564,174 @@ async def split_and_send_zip(file_path: str, skip_zip: bool = False) -> Tuple[bo
         await send_error_message(base_name)
         return False, 0
 
-async def create_zip_archive(file_path: str, base_name: str, temp_dir: str, skip_zip: bool) -> str:
-    """Creates a zip archive of the file, either compressing it or using the original if it's already a zip."""
-    if not skip_zip and COMPRESSION_LEVEL != 'none' and not file_path.lower().endswith('.zip'):
+class PartStreamWriter:
+    """Unseekable file object that cuts zipfile output, or an existing archive, into MAX_FILE_SIZE parts for part_queue."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, part_queue: asyncio.Queue) -> None:
+        self.loop = loop
+        self.part_queue = part_queue
+        self.buffer = bytearray()
+        self.held_parts = 0  # This writer's share of queued_parts
+        self.aborted = False
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        while len(self.buffer) >= MAX_FILE_SIZE:
+            with memoryview(self.buffer) as view:
+                part = bytes(view[:MAX_FILE_SIZE])
+            del self.buffer[:MAX_FILE_SIZE]
+            self.emit(part)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def emit(self, part: Optional[bytes]) -> None:
+        """Queues a part for upload, or the end marker when part is None."""
+        global queued_parts
+        if part is not None:
+            with part_budget:
+                part_budget.wait_for(lambda: self.aborted or queued_parts < PART_QUEUE_SIZE)
+                if self.aborted:
+                    raise RuntimeError("Part upload aborted")
+                queued_parts += 1
+                self.held_parts += 1
+        self.loop.call_soon_threadsafe(self.part_queue.put_nowait, part)
+
+    def part_sent(self) -> None:
+        """Releases the budget of an uploaded part. Called from the event loop."""
+        global queued_parts
+        with part_budget:
+            queued_parts -= 1
+            self.held_parts -= 1
+            part_budget.notify_all()
+
+    def abort(self) -> None:
+        """Releases the parts left unsent and makes a writer blocked in emit() fail. Called from the event loop."""
+        global queued_parts
+        with part_budget:
+            self.aborted = True
+            queued_parts -= self.held_parts
+            self.held_parts = 0
+            part_budget.notify_all()
+
+    def write_zip(self, file_path: str, base_name: str) -> None:
+        """Deflates a file into this stream as a zip archive, then flushes the last part and the end marker."""
+        try:
+            with zipfile.ZipFile(cast(IO[bytes], self), 'w', ZIP_COMPRESSION, compresslevel=ZIP_COMPRESSLEVEL) as zipf:
+                add_to_zip(zipf, file_path, base_name)
+            self.emit_remainder()
+        finally:
+            self.emit(None)
+
+    def write_zstd(self, file_path: str) -> None:
+        """Compresses a file into this stream as a zstd frame, then flushes the last part and the end marker."""
+        assert zstandard is not None  # compression_level = zstd is rejected at startup without it
+        try:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+            with open(file_path, 'rb') as src:
+                compressor.copy_stream(src, cast(IO[bytes], self), read_size=ZSTD_IO_SIZE, write_size=ZSTD_IO_SIZE)
+            self.emit_remainder()
+        finally:
+            self.emit(None)
+
+    def emit_remainder(self) -> None:
+        """Queues the buffered data that did not fill a whole part."""
+        if self.buffer:
+            self.emit(bytes(self.buffer))
+            self.buffer.clear()
+
+    def split_file(self, zip_path: str) -> None:
+        """Emits the parts of an archive on disk, sliced straight out of a read-only memory map of it."""
+        try:
+            with open(zip_path, 'rb') as zip_file, mmap.mmap(zip_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(0, len(mm), MAX_FILE_SIZE):
+                    self.emit(mm[offset:offset + MAX_FILE_SIZE])
+        finally:
+            self.emit(None)
+
+async def stream_and_send_zip(file_path: str, base_name: str) -> Tuple[bool, int]:
+    """Compresses an unencrypted file and uploads the zip or zstd archive part by part while it is being produced."""
+    global file_counter
+    loop = asyncio.get_running_loop()
+    part_queue: asyncio.Queue = asyncio.Queue()
+    writer = PartStreamWriter(loop, part_queue)
+    zip_name = f'{base_name}{ARCHIVE_SUFFIX}'
+    logger.info(f"Compressing and streaming file: {file_path}")
+    if COMPRESSION_LEVEL == 'zstd':
+        compression = loop.run_in_executor(zip_pool, writer.write_zstd, file_path)
+    else:
+        compression = loop.run_in_executor(zip_pool, writer.write_zip, file_path, base_name)
+    file_number = 1
+    sent_size = 0
+    try:
+        while (part := await part_queue.get()) is not None:
+            if file_number == 1 and len(part) < MAX_FILE_SIZE:
+                logger.info(f"Sending file: {zip_name}")
+                success = await send_file(zip_name, f"File: {base_name}\n{ENCRYPTION_STATUS}", content=part)
+                writer.part_sent()
+                if not success:
+                    return False, 0
+                await compression
+                return True, len(part)
+
+            chunk_name = f'{zip_name}.{file_number:03d}'
+            logger.info(f"Sending part {file_number}: {chunk_name}")
+            caption = f"Part {file_number} of {zip_name}"
+            success = await send_file(chunk_name, caption, part_number=file_number, content=part)
+            writer.part_sent()
+            if not success:
+                logger.error(f"Failed to send part {file_number} of {zip_name}")
+                return False, 0
+
+            sent_size += len(part)
+            file_number += 1
+            file_counter += 1
+        await compression  # Re-raise any compression error
+
+        await send_reassembly_instructions(base_name, file_number)
+        return True, sent_size
+    except Exception as e:
+        logger.error(f"Error streaming file {file_path}: {str(e)}")
+        await send_error_message(base_name)
+        return False, 0
+    finally:
+        writer.abort()
+        await asyncio.gather(compression, return_exceptions=True)
+
+def add_to_zip(zipf: zipfile.ZipFile, file_path: str, base_name: str) -> None:
+    """Adds a file to an open zip archive as base_name, copying it in ZIP_COPY_BUFFER_SIZE blocks."""
+    # pyzipper's AESZipFile needs its own ZipInfo class, which carries the encryption settings
+    zinfo: Any = getattr(zipf, 'zipinfo_cls', zipfile.ZipInfo).from_file(file_path, base_name)
+    zinfo.compress_type = zipfile.ZIP_STORED if base_name.lower().endswith(INCOMPRESSIBLE_EXTENSIONS) else zipf.compression
+    zinfo._compresslevel = zipf.compresslevel  # Mirrors ZipFile.write
+    with open(file_path, 'rb', buffering=0) as src, zipf.open(zinfo, 'w') as dest:
+        shutil.copyfileobj(src, dest, ZIP_COPY_BUFFER_SIZE)
+
+def write_zip(file_path: str, base_name: str, zip_path: str) -> None:
+    """Writes a file into a zip archive, AES-encrypted with pyzipper when encryption is enabled."""
+    if ENABLE_ENCRYPTION:
+        with pyzipper.AESZipFile(zip_path, 'w', compression=ZIP_COMPRESSION, compresslevel=ZIP_COMPRESSLEVEL,
+                                 encryption=pyzipper.WZ_AES) as zipf:
+            zipf.setpassword(ZIP_PASSWORD.encode())
+            add_to_zip(zipf, file_path, base_name)
+    else:
+        with zipfile.ZipFile(zip_path, 'w', ZIP_COMPRESSION, compresslevel=ZIP_COMPRESSLEVEL) as zipf:
+            add_to_zip(zipf, file_path, base_name)
+
+async def create_zip_archive(file_path: str, base_name: str, temp_dir: str, compress: bool) -> str:
+    """Creates a zip archive of the file when compress is set, otherwise returns the original path."""
+    if compress:
         zip_path = os.path.join(temp_dir, f'{base_name}.zip')
         logger.info(f"Compressing file: {file_path}")
-        compression = zipfile.ZIP_DEFLATED if COMPRESSION_LEVEL == 'default' else zipfile.ZIP_STORED
-        if ENABLE_ENCRYPTION:
-            with pyzipper.AESZipFile(zip_path, 'w', compression=compression,
-                                     encryption=pyzipper.WZ_AES) as zipf:
-                zipf.setpassword(ZIP_PASSWORD.encode())
-                zipf.write(file_path, base_name)
-        else:
-            with zipfile.ZipFile(zip_path, 'w', compression) as zipf:
-                zipf.write(file_path, base_name)
+        await asyncio.get_running_loop().run_in_executor(zip_pool, write_zip, file_path, base_name, zip_path)
         return zip_path
     else:
         return file_path
 
 async def send_reassembly_instructions(base_name: str, file_number: int) -> None:
     """Sends instructions to the user on how to reassemble the split files."""
-    encryption_note = "The ZIP file is encrypted. You'll need the password to extract it." if ENABLE_ENCRYPTION else "The ZIP file is not encrypted."
-    instructions = f"""```
-To reassemble the file:
-1. Download all parts ({file_number - 1} in total)
-2. Use one of the following commands:
-   # Windows
-   copy /b {base_name}.zip.* {base_name}.zip
-
-   # Linux/Mac
-   cat {base_name}.zip.* > {base_name}.zip
-3. Extract {base_name}.zip
-
-{encryption_note}
-```"""
+    instructions = REASSEMBLY_TEMPLATE.substitute(base_name=base_name, total_parts=file_number - 1)
     async with message_limiter:  # Apply rate limit to message sending
         await bot.send_message(chat_id=CHAT_ID, text=instructions, parse_mode=ParseMode.MARKDOWN)
     if FORWARD_CHAT_ID and ENABLE_FORWARD:
@@ -296,7 +747,6 @@ async def send_event_to_backend(event_type: str, file_name: str, file_id: int, f
                                upload_speed: float) -> None:
     """Sends an event to the backend server, logging any errors."""
     try:
-        backend_url = 'http://localhost:5000/event'
         data = {
             'type': event_type,
             'file': file_name,
@@ -305,80 +755,106 @@ async def send_event_to_backend(event_type: str, file_name: str, file_id: int, f
             'file_size': file_size,
             'processing_time': processing_time,'upload_speed': upload_speed
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(backend_url, json=data, timeout=5) as response:
-                if not response.ok:
-                    logger.warning(f"Error sending event to backend: {await response.text()}")
+        async with http_session.post('/event', data=dumps_payload(data)) as response:
+            if not response.ok:
+                logger.warning(f"Error sending event to backend: {await response.text()}")
     except Exception as e:
         logger.warning(f"Unable to connect to backend: {str(e)}")
 
-async def process_file(file_path: str) -> None:
-    """Processes a file, compressing, splitting, and sending it to Telegram."""
-    global file_counter
-    start_time = time.time()
-    file_hash = calculate_md5(file_path)
-    original_size = os.path.getsize(file_path)
-    base_name = os.path.basename(file_path)
-    upload_start_time = time.time()
+async def process_file(file_path: str, upload_slots: asyncio.Semaphore) -> None:
+    """Processes a file, compressing, splitting, and sending it to Telegram while holding one of upload_slots."""
+    if not is_allowed_extension(os.path.basename(file_path)):
+        logger.info(f"File ignored (extension not allowed): {file_path}")
+        return
+
+    start_ns = time.monotonic_ns()
+    file_stat = await asyncio.to_thread(os.stat, file_path)
+    if is_unchanged(file_path, file_stat.st_size, file_stat.st_mtime_ns):
+        return  # Unchanged since it was last sent, no need to hash it again
+    history_entry = file_history.get(file_path)
 
-    if any(file_data['hash'] == file_hash for file_data in file_history.values()):
-        logger.info(f"File with the same hash already exists: {file_path}")
+    file_hash = await asyncio.get_running_loop().run_in_executor(hash_pool, calculate_digest, file_path)
+    indexed_path = hash_index.get(file_hash)
+    if indexed_path is not None:
+        if indexed_path == file_path:
+            file_history[file_path]['mtime_ns'] = file_stat.st_mtime_ns  # Touched but unchanged, skip it next time
+            dirty_paths.add(file_path)
+        else:
+            skipped_duplicates[file_path] = (file_stat.st_size, file_stat.st_mtime_ns)  # Let is_unchanged skip it next time
+            logger.info(f"File with the same hash already exists: {file_path}")
         return
 
-    if ALLOWED_EXTENSIONS and not any(base_name.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
-        logger.info(f"File ignored (extension not allowed): {file_path}")
+    if file_hash in pending_hashes:
+        logger.info(f"File with the same hash is already being sent: {file_path}")
         return
+    # No await since the lookups above, so reserving the hash cannot race with another process_file
+    pending_hashes.add(file_hash)
+    try:
+        async with upload_slots:
+            await send_new_file(file_path, file_hash, file_stat, history_entry, start_ns)
+    finally:
+        pending_hashes.discard(file_hash)
+
+async def send_new_file(file_path: str, file_hash: str, file_stat: os.stat_result,
+                        history_entry: Optional[Dict], start_ns: int) -> None:
+    """Compresses, splits if needed, and sends a new or modified file, then records it in file_history."""
+    global file_counter
+    original_size = file_stat.st_size
+    base_name = os.path.basename(file_path)
+    upload_start_ns = time.monotonic_ns()
 
     with tempfile.TemporaryDirectory() as temp_dir:
-        if COMPRESSION_LEVEL == 'none' or (file_path.lower().endswith('.zip') and not ENABLE_ENCRYPTION):
+        if COMPRESSION_LEVEL == 'none' or (not ENABLE_ENCRYPTION and file_path.lower().endswith('.zip')):
             send_path = file_path
+        elif not ENABLE_ENCRYPTION and (original_size > MAX_FILE_SIZE or COMPRESSION_LEVEL == 'zstd'):
+            send_path = None  # Compressed and split on the fly by stream_and_send_zip
         else:
             send_path = os.path.join(temp_dir, f'{base_name}.zip')
             logger.info(f"Compressing file: {file_path} into {send_path}")
-            compression = zipfile.ZIP_DEFLATED if COMPRESSION_LEVEL == 'default' else zipfile.ZIP_STORED
-            if ENABLE_ENCRYPTION:
-                with pyzipper.AESZipFile(send_path, 'w', compression=compression, encryption=pyzipper.WZ_AES) as zipf:
-                    zipf.setpassword(ZIP_PASSWORD.encode())
-                    zipf.write(file_path, base_name)
-            else:
-                with zipfile.ZipFile(send_path, 'w', compression) as zipf:
-                    zipf.write(file_path, base_name)
+            await asyncio.get_running_loop().run_in_executor(zip_pool, write_zip, file_path, base_name, send_path)
 
         if file_path not in file_history or file_history[file_path]['hash'] != file_hash:
             logger.info(f"New file detected or file modified: {file_path}")
 
-            if os.path.getsize(send_path) > MAX_FILE_SIZE:
+            send_size = await asyncio.to_thread(os.path.getsize, send_path) if send_path is not None else 0
+            if send_path is None:
+                success, file_size = await stream_and_send_zip(file_path, base_name)
+            elif send_size > MAX_FILE_SIZE:
                 logger.info(f"File size exceeds {MAX_FILE_SIZE} bytes. Splitting and sending: {send_path}")
-                if send_path.lower().endswith('.zip'):
-                    success, file_size = await split_and_send_zip(send_path, skip_zip=True)
-                else:
-                    success, file_size = await split_and_send_zip(send_path)
+                # send_path is already the final archive, or the original file when nothing is compressed
+                success, file_size = await split_and_send_zip(send_path, skip_zip=True)
             else:
                 logger.info(f"Sending file: {send_path}")
-                encryption_status = "🔒 Encrypted" if ENABLE_ENCRYPTION else "🔓 Not encrypted"
-                caption = f"File: {base_name}\n{encryption_status}"
+                caption = f"File: {base_name}\n{ENCRYPTION_STATUS}"
                 success = await send_file(send_path, caption)
-                file_size = os.path.getsize(send_path)
+                file_size = send_size
 
             if success:
                 file_counter += 1
                 encryption_algorithm = "AES" if ENABLE_ENCRYPTION else "None"
-                processing_time = (time.time() - start_time) * 1000
-                upload_speed = file_size / (time.time() - upload_start_time) if (
-                            time.time() - upload_start_time) != 0 else 0
+                end_ns = time.monotonic_ns()
+                processing_time = (end_ns - start_ns) / 1e6  # Milliseconds
+                upload_seconds = (end_ns - upload_start_ns) / 1e9
+                upload_speed = file_size / upload_seconds if upload_seconds else 0
+                if history_entry and hash_index.get(history_entry['hash']) == file_path:
+                    del hash_index[history_entry['hash']]
+                hash_index[file_hash] = file_path
                 file_history[file_path] = {
                     'hash': file_hash,
+                    'hash_algo': HASH_ALGO,
                     'last_sent': datetime.now().isoformat(),
                     'send_success': True,
                     'encrypted': ENABLE_ENCRYPTION,
                     'encryption_algorithm': encryption_algorithm,
                     'file_id': file_counter,
                     'file_size': original_size,
+                    'mtime_ns': file_stat.st_mtime_ns,
                     'processed_size': file_size,
                     'processing_time': processing_time,
                     'upload_speed': upload_speed
                 }
-                save_data(file_history, FILE_HISTORY_PATH)
+                dirty_paths.add(file_path)
+                await flush_file_history()
                 await send_event_to_backend('success', base_name, file_counter, file_hash, original_size,
                                            processing_time, upload_speed)
             else:
@@ -399,33 +875,87 @@ def clean_old_logs() -> None:
                     os.remove(file_path)
                     logger.info(f"Log file deleted for privacy: {filename}")
 
-def build_file_size_cache() -> None:
-    """Creates a cache of file sizes for faster processing."""
+def is_allowed_extension(file_name: str) -> bool:
+    """Checks a file name against ALLOWED_EXTENSIONS; every file is allowed when it is empty."""
+    return not ALLOWED_EXTENSIONS or file_name.lower().endswith(ALLOWED_EXTENSIONS)
+
+def walk_sizes(folder: str) -> Iterator[Tuple[str, int, int]]:
+    """Recursively yields (path, size, mtime_ns) for each allowed file under a folder, from os.scandir entries."""
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from walk_sizes(entry.path)
+                    elif entry.is_file() and is_allowed_extension(entry.name):
+                        entry_stat = entry.stat()
+                        yield entry.path, entry_stat.st_size, entry_stat.st_mtime_ns
+                except OSError as e:
+                    logger.warning(f"Unable to stat {entry.path}: {str(e)}")
+    except OSError as e:
+        logger.warning(f"Unable to scan folder {folder}: {str(e)}")
+
+def is_unchanged(file_path: str, size: int, mtime_ns: int) -> bool:
+    """Returns True if the file has the size and modification time recorded when it was last sent or skipped."""
+    history_entry = file_history.get(file_path)
+    if history_entry:
+        return history_entry.get('mtime_ns') == mtime_ns and history_entry.get('file_size') == size
+    return skipped_duplicates.get(file_path) == (size, mtime_ns)
+
+def update_file_size_cache(file_paths: List[str]) -> List[str]:
+    """Stats paths reported by filesystem events into file_size_cache, returning the allowed regular files among them."""
+    existing = []
+    cache_changed = False
+    for file_path in file_paths:
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            file_stat = None
+        if file_stat is not None and stat.S_ISREG(file_stat.st_mode) and is_allowed_extension(os.path.basename(file_path)):
+            existing.append(file_path)
+            if ENABLE_CACHE and file_size_cache.get(file_path) != file_stat.st_size:
+                file_size_cache[file_path] = file_stat.st_size
+                cache_changed = True
+        elif ENABLE_CACHE and file_size_cache.pop(file_path, None) is not None:
+            cache_changed = True
+    if cache_changed:
+        save_data(file_size_cache, FILE_SIZE_CACHE_PATH)
+    return existing
+
+def build_file_size_cache(walked: List[Tuple[str, int, int]]) -> None:
+    """Creates a cache of file sizes from a walk_sizes listing, saving it only when a size changed."""
     global file_size_cache
-    for folder in FOLDERS_TO_MONITOR:
-        for root, _, files in os.walk(folder):
-            for file in files:
-                file_path = os.path.join(root, file)
-                file_size_cache[file_path] = os.path.getsize(file_path)
+    sizes = {file_path: size for file_path, size, _ in walked}
+    if sizes == file_size_cache:
+        return
+    file_size_cache = sizes
     save_data(file_size_cache, FILE_SIZE_CACHE_PATH)
     logger.info("File size cache built.")
 
 async def main() -> None:
-    global file_history, file_counter, file_size_cache
+    global file_history, hash_index, file_counter, file_size_cache, http_session, history_db
     logger.info("Bot started.")
     print("Bot started. Press Ctrl+C to interrupt.")
 
+    history_db = open_history_db(FILE_HISTORY_DB_PATH)
     try:
-        file_history = load_data(FILE_HISTORY_PATH)
+        file_history = load_history(history_db)
+        file_counter = load_file_counter(history_db)
     except Exception as e:
         logger.error(f"Error loading file history: {str(e)}")
         file_history = {}
 
-    try:
-        file_counter = max(file_history.values(), key=lambda x: x.get('file_id', 0), default={}).get('file_id', 0)
-    except Exception as e:
-        logger.error(f"Error determining file counter: {str(e)}")
-        file_counter = 0
+    if not file_history and os.path.exists(FILE_HISTORY_PATH):
+        file_history = load_data(FILE_HISTORY_PATH)
+        file_counter = max((file_data.get('file_id', 0) for file_data in file_history.values()), default=0)
+        dirty_paths.update(file_history)
+        await flush_file_history()
+        logger.info(f"Imported {len(file_history)} file history entries from {FILE_HISTORY_PATH}")
+
+    absolutize_history_paths()
+    await migrate_history_hashes()
+    await flush_file_history()
+    hash_index = {file_data['hash']: file_path for file_path, file_data in file_history.items()}
 
     if ENABLE_CACHE:
         try:
@@ -434,43 +964,175 @@ async def main() -> None:
             logger.error(f"Error loading file size cache: {str(e)}")
             file_size_cache = {}
 
+    http_session = aiohttp.ClientSession(BACKEND_URL, connector=aiohttp.TCPConnector(limit=MAX_CONCURRENT_FILES),
+                                         headers=BACKEND_HEADERS, timeout=aiohttp.ClientTimeout(total=5))
+    try:
+        await send_history_to_backend()
+        if Observer is not None:
+            await watch_loop()
+        else:
+            await monitor_loop()
+    finally:
+        await flush_file_history()
+        await http_session.close()
+        with history_db_lock:
+            history_db.close()
+
+async def process_files(file_paths: List[str]) -> None:
+    """Processes files concurrently, uploading at most MAX_CONCURRENT_FILES at a time, logging per-file errors."""
+    upload_slots = asyncio.Semaphore(MAX_CONCURRENT_FILES)
+    results = await asyncio.gather(*(process_file(file_path, upload_slots) for file_path in file_paths),
+                                   return_exceptions=True)
+    for file_path, result in zip(file_paths, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error processing file {file_path}: {str(result)}")
+
+async def send_history_to_backend() -> None:
+    """Sends the full file history to the backend on startup."""
     try:
-        backend_url = 'http://localhost:5000/file_history'
-        async with aiohttp.ClientSession() as session:
-            async with session.post(backend_url, json=file_history, timeout=5) as response:
-                if not response.ok:
-                    logger.warning(f"Error sending file history to backend: {await response.text()}")
+        async with http_session.post('/file_history', data=dumps_payload(file_history)) as response:
+            if not response.ok:
+                logger.warning(f"Error sending file history to backend: {await response.text()}")
     except Exception as e:
         logger.warning(f"Unable to connect to backend: {str(e)}")
         print(f"Error: Unable to connect to backend. Please check if the Flask backend is running.")
 
-    while True:
-        try:
-            clean_old_logs()
+async def scan_and_process() -> None:
+    """Walks all monitored folders once and processes their files, smallest first."""
+    clean_old_logs()
 
-            if ENABLE_CACHE:
-                build_file_size_cache()
-                sorted_files = sorted(file_size_cache, key=file_size_cache.get)
-            else:
-                sorted_files = []
-                for folder in FOLDERS_TO_MONITOR:
-                    for root, _, files in os.walk(folder):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            sorted_files.append(file_path)
-                sorted_files.sort(key=os.path.getsize)
+    walked = [walked_file for folder in FOLDERS_TO_MONITOR for walked_file in walk_sizes(folder)]
+    if ENABLE_CACHE:
+        build_file_size_cache(walked)
+
+    # Unchanged files are skipped on the stat taken by the walk
+    file_sizes = [(size, file_path) for file_path, size, mtime_ns in walked if not is_unchanged(file_path, size, mtime_ns)]
+    file_sizes.sort()
+    sorted_files = [file_path for _, file_path in file_sizes]
+
+    await process_files(sorted_files)
+    await flush_file_history()
+
+def file_size_or_none(file_path: str) -> Optional[int]:
+    """Returns the size of a file, or None if it doesn't exist anymore."""
+    try:
+        return os.stat(file_path).st_size
+    except OSError:
+        return None
+
+def current_file_sizes(file_paths: List[str]) -> List[Optional[int]]:
+    """Returns file_size_or_none for each of file_paths."""
+    return [file_size_or_none(file_path) for file_path in file_paths]
 
-            for file_path in sorted_files:
-                await process_file(file_path)
+class FolderEventHandler:
+    """Forwards (path, event time, file size or None) of changed files from the watchdog thread to an asyncio queue."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, changed_paths: asyncio.Queue) -> None:
+        self.loop = loop
+        self.changed_paths = changed_paths
+
+    def dispatch(self, event: Any) -> None:
+        """Called by the watchdog observer for every event, like FileSystemEventHandler.dispatch."""
+        handler = getattr(self, f'on_{event.event_type}', None)
+        if handler is not None:
+            handler(event)
+
+    def queue_path(self, file_path: str) -> None:
+        change = (file_path, time.monotonic(), file_size_or_none(file_path))
+        self.loop.call_soon_threadsafe(self.changed_paths.put_nowait, change)
+
+    def on_created(self, event) -> None:
+        if not event.is_directory:
+            self.queue_path(event.src_path)
+
+    def on_modified(self, event) -> None:
+        if not event.is_directory:
+            self.queue_path(event.src_path)
+
+    def on_moved(self, event) -> None:
+        if not event.is_directory:
+            self.queue_path(event.src_path)  # Dropped from the file size cache
+            self.queue_path(event.dest_path)
+
+    def on_deleted(self, event) -> None:
+        if not event.is_directory:
+            self.queue_path(event.src_path)
+
+async def watch_loop() -> None:
+    """Processes changed files once their events have settled, rescanning everything every RECONCILE_INTERVAL."""
+    changed_paths: asyncio.Queue = asyncio.Queue()
+    settling: Dict[str, Tuple[float, Optional[int]]] = {}  # path -> (time of its last event, size seen then)
+    assert Observer is not None  # Only called when watchdog is installed
+    observer = Observer()
+    event_handler = FolderEventHandler(asyncio.get_running_loop(), changed_paths)
+    for folder in FOLDERS_TO_MONITOR:
+        if os.path.isdir(folder):
+            observer.schedule(event_handler, folder, recursive=True)
+        else:
+            logger.warning(f"Monitored folder not found: {folder}")
+    observer.start()
+    logger.info("Watching monitored folders for changes.")
+
+    next_reconcile = 0.0
+    try:
+        while True:
+            try:
+                if time.monotonic() >= next_reconcile:
+                    await scan_and_process()
+                    next_reconcile = time.monotonic() + RECONCILE_INTERVAL
+
+                if changed_paths.empty():
+                    # Sleep until the next event, the next settle deadline or the reconcile scan, whichever is first
+                    deadline = min([next_reconcile, *(event_time + EVENT_SETTLE_DELAY for event_time, _ in settling.values())])
+                    try:
+                        file_path, event_time, size = await asyncio.wait_for(changed_paths.get(),
+                                                                             timeout=max(deadline - time.monotonic(), 0))
+                        settling[file_path] = (event_time, size)
+                    except asyncio.TimeoutError:
+                        pass
+                while not changed_paths.empty():
+                    file_path, event_time, size = changed_paths.get_nowait()
+                    settling[file_path] = (event_time, size)
+
+                now = time.monotonic()
+                due = [file_path for file_path, (event_time, _) in settling.items() if now - event_time >= EVENT_SETTLE_DELAY]
+                if not due:
+                    continue
+                batch = []
+                for file_path, size in zip(due, await asyncio.to_thread(current_file_sizes, due)):
+                    if size == settling[file_path][1]:
+                        del settling[file_path]
+                        batch.append(file_path)
+                    else:
+                        settling[file_path] = (now, size)  # Still being written, wait for it to settle again
+                if not batch:
+                    continue
+                file_paths = await asyncio.to_thread(update_file_size_cache, batch)
+                await process_files(file_paths)
+                await flush_file_history()
+            except Exception as e:
+                logger.error(f"General error: {str(e)}")
+                await flush_file_history()
+                await asyncio.sleep(CHECK_INTERVAL)
+    finally:
+        observer.stop()
+        observer.join()
+
+async def monitor_loop() -> None:
+    """Scans the monitored folders every CHECK_INTERVAL seconds and processes their files."""
+    while True:
+        try:
+            await scan_and_process()
 
             await asyncio.sleep(CHECK_INTERVAL)
-        except KeyboardInterrupt:
-            logger.info("Bot manually interrupted.")
-            print("Bot manually interrupted.")
-            break
         except Exception as e:
             logger.error(f"General error: {str(e)}")
+            await flush_file_history()
             await asyncio.sleep(CHECK_INTERVAL)
 
 if __name__ == "__main__":
-    asyncio.get_event_loop().run_until_complete(main())
+    try:
+        asyncio.run(main())  # Ctrl+C cancels main(), whose finally saves the history
+    except KeyboardInterrupt:
+        logger.info("Bot manually interrupted.")
+        print("Bot manually interrupted.")
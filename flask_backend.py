@@ -1,20 +1,69 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, send_file, send_from_directory, stream_with_context
+import io
 import os
+import gzip
+import shutil
 import json
 import configparser
+import sqlite3
 import pyzipper
 import logging
+import mmap
 import tempfile
 import signal
+import threading
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import Optional
 import time
+import unicodedata
+from urllib.parse import quote
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    from waitress import serve
+except ImportError:
+    serve = None
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='templates', template_folder='templates')
+# Don't check index.html's mtime on every render, even in debug mode
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+IN_MEMORY_ZIP_SIZE = 64 * 1024 * 1024  # Encrypted archives up to this size are rebuilt and decrypted in memory
+MONITOR_BATCH_SIZE = 256  # History entries serialized per chunk of the streamed /monitor response
+SERVER_THREADS = 8  # Requests served concurrently by waitress
+HISTORY_SAVE_DELAY = 2.0  # Seconds to batch file history changes before writing them
+BACKEND_HISTORY_PATH = 'data/backend_file_history.json.gz'
+LEGACY_BACKEND_HISTORY_PATH = 'data/backend_file_history.json'  # Uncompressed history of earlier versions
+BACKEND_HISTORY_LOG_PATH = 'data/backend_file_history.jsonl'  # Entries changed since the last saved snapshot, one per line
+HISTORY_COMPACT_ENTRIES = 1000  # Log entries after which the snapshot is rewritten and the log emptied
 
 # Global variables to store events and file history
 events = []
 file_history = {}
+history_version = 0  # Bumped on every file_history change, for the /monitor ETag
+HISTORY_ETAG_PREFIX = f'{time.time_ns():x}'  # Keeps ETags from a previous backend run from matching
+history_save_timer = None  # Pending delayed save_file_history(), if any
+history_save_lock = threading.Lock()
+history_log_entries = 0  # Entries in the history log, compacted into the snapshot at HISTORY_COMPACT_ENTRIES
+file_id_index = {}  # file_id -> file path in file_history
+monitor_view = {}  # file path -> {'file_path': ..., **entry} as served by /monitor, kept in step with file_history
 
 # API statistics data
 api_stats = {
@@ -35,20 +84,74 @@ file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
 # --- Load File History on Startup ---
+history_path = BACKEND_HISTORY_PATH if os.path.exists(BACKEND_HISTORY_PATH) else LEGACY_BACKEND_HISTORY_PATH
 try:
-    with open('data/backend_file_history.json', 'r') as f:
-        file_history = json.load(f)
-    logger.info("File history loaded from data/backend_file_history.json")
+    with (gzip.open if history_path.endswith('.gz') else open)(history_path, 'rb') as f:
+        file_history = (orjson or json).loads(f.read())
+    logger.info(f"File history loaded from {history_path}")
 except FileNotFoundError:
     logger.info("File history not found. Creating new file history.")
-except json.JSONDecodeError:
-    logger.error("Error decoding JSON from backend_file_history.json. Creating new file history.")
+except (json.JSONDecodeError, gzip.BadGzipFile, EOFError):  # orjson.JSONDecodeError is a subclass
+    logger.error(f"Error decoding JSON from {history_path}. Creating new file history.")
+
+# Apply the entries logged after the snapshot was saved
+replayed_log_size = 0
+try:
+    with open(BACKEND_HISTORY_LOG_PATH, 'rb') as f:
+        for line in f:
+            try:
+                record = (orjson or json).loads(line)
+                file_history[record['path']] = record['entry']
+            except (json.JSONDecodeError, KeyError, TypeError):
+                logger.warning(f"Skipping unreadable entry in {BACKEND_HISTORY_LOG_PATH}")
+                continue
+            history_log_entries += 1
+        replayed_log_size = f.tell()
+    logger.info(f"Applied {history_log_entries} entries from {BACKEND_HISTORY_LOG_PATH}")
+except FileNotFoundError:
+    pass
+
+os.makedirs('data', exist_ok=True)
+history_log = open(BACKEND_HISTORY_LOG_PATH, 'ab')
+
+
+def build_file_id_index():
+    """Rebuilds file_id_index from file_history."""
+    global file_id_index
+    file_id_index = {int(file_data['file_id']): file_path for file_path, file_data in file_history.items()
+                     if file_data.get('file_id') is not None}
+
+
+def build_monitor_view():
+    """Rebuilds monitor_view from file_history."""
+    monitor_view.clear()
+    monitor_view.update((file_path, {'file_path': file_path, **file_data}) for file_path, file_data in file_history.items())
+
+
+build_file_id_index()
+build_monitor_view()
 
 # --- Load Configuration ---
-config = configparser.ConfigParser()
-config.read('config/config.ini')
-ENABLE_ENCRYPTION = config['General'].getboolean('enable_encryption', False)
-ZIP_PASSWORD = config['General'].get('zip_password', '')
+CONFIG_PATH = 'config/config.ini'
+config_cache = {'mtime_ns': None, 'data': {}}
+
+
+def get_config():
+    """Returns the configuration as a {section: {key: value}} dict, parsing config.ini again only when it changed."""
+    global ENABLE_ENCRYPTION, ZIP_PASSWORD, ZIP_PASSWORD_BYTES
+    mtime_ns = os.stat(CONFIG_PATH).st_mtime_ns
+    if mtime_ns != config_cache['mtime_ns']:
+        config = configparser.ConfigParser()
+        config.read(CONFIG_PATH)
+        config_cache['data'] = {section: dict(config[section]) for section in config.sections()}
+        config_cache['mtime_ns'] = mtime_ns
+        ENABLE_ENCRYPTION = config['General'].getboolean('enable_encryption', False)
+        ZIP_PASSWORD = config['General'].get('zip_password', '')
+        ZIP_PASSWORD_BYTES = ZIP_PASSWORD.encode('utf-8')
+    return config_cache['data']
+
+
+get_config()
 
 
 # --- Flask Routes ---
@@ -56,15 +159,13 @@ ZIP_PASSWORD = config['General'].get('zip_password', '')
 @app.route('/')
 def index():
     """Renders the main HTML page with configuration and file history."""
-    config = configparser.ConfigParser()
-    config.read('config/config.ini')
-    return render_template('index.html', config=config, file_history=file_history)
+    return render_template('index.html', config=get_config(), file_history=file_history)
 
 
 @app.route('/update_config', methods=['POST'])
 def update_config():
     config = configparser.ConfigParser()
-    config.read('config/config.ini')
+    config.read_dict(get_config())
 
     for section in config.sections():
         for key in config[section]:
@@ -74,48 +175,76 @@ def update_config():
             else:
                 config[section][key] = request.form[key]
 
-    with open('config/config.ini', 'w') as configfile:
-        config.write(configfile)
+    with open(CONFIG_PATH, 'w') as configfile:
+        config.write(configfile)  # The new mtime makes the next get_config() pick up the change
 
     return redirect(url_for('index'), code=302)
 
 
 @app.route('/monitor')
 def monitor():
-    """Provides file history data as JSON to the web client."""
-    return jsonify(list(map(lambda item: {'file_path': item[0], **item[1]}, file_history.items())))
+    """Provides file history data as JSON to the web client, or an empty 304 when its ETag is unchanged."""
+    etag = f'"{HISTORY_ETAG_PREFIX}-{history_version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, {'ETag': etag, 'Cache-Control': 'no-cache'}
+    return Response(stream_with_context(stream_history_json(list(monitor_view.values()))), mimetype='application/json',
+                    headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+
+def stream_history_json(entries):
+    """Yields a JSON array of monitor_view entries in chunks of MONITOR_BATCH_SIZE entries."""
+    yield b'['
+    for start in range(0, len(entries), MONITOR_BATCH_SIZE):
+        chunk = b','.join(dumps_json(entry) for entry in entries[start:start + MONITOR_BATCH_SIZE])
+        yield chunk if start == 0 else b',' + chunk
+    yield b']'
 
 
 @app.route('/download/<file_id>')
 def download(file_id):
     """Handles file downloads, including decryption for encrypted files."""
-    found_file = next((file_path for file_path, file_data in file_history.items() if file_data['file_id'] == int(file_id)), None)
+    found_file = file_id_index.get(int(file_id))
 
     if found_file:
         logger.info(f"Download requested for file: {found_file}")
 
         base_name = os.path.basename(found_file)
+        if not file_history[found_file]['encrypted']:
+            # Stream the parts to the client as they are read
+            part_dir = tempfile.mkdtemp()
+            response = Response(stream_with_context(stream_parts(part_dir, find_parts(part_dir, base_name))),
+                                mimetype='application/zip')
+            response.headers.set('Content-Disposition', 'attachment', **attachment_filenames(f'{base_name}.zip'))
+            # Also runs when the client disconnects before the body is iterated
+            response.call_on_close(lambda: shutil.rmtree(part_dir, ignore_errors=True))
+            return response
+
+        get_config()  # Refreshes ZIP_PASSWORD_BYTES if config.ini was edited since it was last read
         with tempfile.TemporaryDirectory() as temp_dir:
             zip_path = os.path.join(temp_dir, f'{base_name}.zip')
 
-            # Reconstruct the ZIP file from the sent parts
-            parts = [f for f in os.listdir(temp_dir) if f.startswith(base_name) and f.endswith('.zip')]
-            parts.sort()
+            # Reconstruct the ZIP file from the sent parts; pyzipper needs the whole archive to decrypt it
+            parts = [os.path.join(temp_dir, part) for part in find_parts(temp_dir, base_name)]
+
+            if sum(map(os.path.getsize, parts)) <= IN_MEMORY_ZIP_SIZE:
+                # Small archives are rebuilt, decrypted and sent without writing them to disk
+                archive = io.BytesIO()
+                for part in parts:
+                    with open(part, 'rb') as chunk:
+                        shutil.copyfileobj(chunk, archive)
+                if not decrypt_archive(archive, temp_dir, found_file):
+                    return "Error decrypting file. Please check the password.", 400
+                archive.seek(0)
+                return send_file(archive, mimetype='application/zip', as_attachment=True, download_name=f'{base_name}.zip')
 
             with open(zip_path, 'wb') as zipf:
                 for part in parts:
-                    with open(os.path.join(temp_dir, part), 'rb') as chunk:
-                        zipf.write(chunk.read())
-
-            # Decrypt the ZIP file if necessary
-            if file_history[found_file]['encrypted']:
-                try:
-                    with pyzipper.AESZipFile(zip_path, 'r', encryption=pyzipper.WZ_AES) as zipf:
-                        zipf.setpassword(ZIP_PASSWORD.encode())
-                        zipf.extractall(path=temp_dir)
-                        logger.info(f"File decrypted successfully: {found_file}")
-                except Exception as e:
-                    logger.error(f"Error decrypting file: {found_file}, {str(e)}")
+                    with open(part, 'rb') as chunk:
+                        append_file(chunk, zipf)
+
+            # Decrypt the ZIP file from a memory map of the archive that was just written
+            with open(zip_path, 'rb') as f, MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if not decrypt_archive(mapped, temp_dir, found_file):
                     return "Error decrypting file. Please check the password.", 400
 
             # Download the ZIP file
@@ -125,14 +254,83 @@ def download(file_id):
         return "File not found.", 404
 
 
+def decrypt_archive(archive, path, found_file):
+    """Extracts an encrypted ZIP file object into path, returning False when it cannot be decrypted."""
+    try:
+        with pyzipper.AESZipFile(archive, 'r', encryption=pyzipper.WZ_AES) as zipf:
+            zipf.setpassword(ZIP_PASSWORD_BYTES)
+            zipf.extractall(path=path)
+            logger.info(f"File decrypted successfully: {found_file}")
+        return True
+    except Exception as e:
+        logger.error(f"Error decrypting file: {found_file}, {str(e)}")
+        return False
+
+
+class MappedFile(mmap.mmap):
+    """Read-only memory map that reports itself seekable, as zipfile requires of file objects."""
+
+    def seekable(self):
+        return True
+
+
+def find_parts(part_dir, base_name):
+    """Returns the names of the ZIP parts of a file in a directory, ordered by part number."""
+    with os.scandir(part_dir) as entries:
+        return sorted((entry.name for entry in entries if entry.name.startswith(base_name) and entry.name.endswith('.zip')),
+                      key=part_number)
+
+
+def part_number(part_name):
+    """Returns the number in a part name such as 'file.bin.012.zip', or 0 when it has none."""
+    number = part_name[:-len('.zip')].rpartition('.')[2]
+    return int(number) if number.isdigit() else 0
+
+
+def append_file(src, dest):
+    """Appends an open file to another, copying in the kernel with os.sendfile where it supports file targets."""
+    if hasattr(os, 'sendfile'):
+        offset = 0
+        try:
+            size = os.fstat(src.fileno()).st_size
+            while offset < size and (sent := os.sendfile(dest.fileno(), src.fileno(), offset, size - offset)):
+                offset += sent
+            return
+        except OSError:
+            src.seek(offset)  # e.g. macOS, where sendfile only writes to sockets
+    shutil.copyfileobj(src, dest, 4 * 1024 * 1024)
+
+
+def stream_parts(part_dir, parts):
+    """Yields the contents of the parts in order, in DOWNLOAD_CHUNK_SIZE chunks."""
+    for part in parts:
+        with open(os.path.join(part_dir, part), 'rb') as chunk_file:
+            while chunk := chunk_file.read(DOWNLOAD_CHUNK_SIZE):
+                yield chunk
+
+
+def attachment_filenames(filename):
+    """Returns Content-Disposition filename parameters, with an RFC 5987 UTF-8 name for non-ASCII filenames."""
+    try:
+        filename.encode('ascii')
+        return {'filename': filename}
+    except UnicodeEncodeError:
+        ascii_filename = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': ascii_filename, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"}
+
+
 @app.route('/file_history', methods=['POST'])
 def update_file_history():
     """Updates the file history with data received from the bot."""
-    global file_history
-    data = request.get_json()
+    global history_version
+    data = get_payload()
     if data:
-        file_history = data
-        save_file_history()
+        file_history.clear()
+        file_history.update(data)
+        history_version += 1
+        build_file_id_index()
+        build_monitor_view()
+        schedule_file_history_save()
         return "File history updated", 200
     else:
         return "Invalid data", 400
@@ -141,34 +339,138 @@ def update_file_history():
 @app.route('/event', methods=['POST'])
 def handle_event():
     """Handles events sent from the bot."""
-    global events, file_history
-    data = request.get_json()
-    if data:
-        events.append(data)
-        if data['type'] == 'success':
-            file_history[data['file']] = {
-                'hash': data['hash'],
+    global events, file_history, history_version
+    event = get_event()
+    if event is not None:
+        events.append(event)
+        if event.type == 'success':
+            get_config()  # Refreshes ENABLE_ENCRYPTION if config.ini was edited since it was last read
+            file_history[event.file] = {
+                'hash': event.hash,
                 'last_sent': datetime.now().isoformat(),
                 'send_success': True,
-                'forward_success': data.get('forward_success'),
+                'forward_success': event.forward_success,
                 'encrypted': ENABLE_ENCRYPTION,
                 'encryption_algorithm': "AES" if ENABLE_ENCRYPTION else "None",
-                'file_id': data['file_id'],
-                'file_size': data.get('file_size'),
-                'processing_time': data.get('processing_time'),
-                'upload_speed': data.get('upload_speed')
+                'file_id': event.file_id,
+                'file_size': event.file_size,
+                'processing_time': event.processing_time,
+                'upload_speed': event.upload_speed
             }
-            save_file_history()
+            file_id_index[int(event.file_id)] = event.file
+            monitor_view[event.file] = {'file_path': event.file, **file_history[event.file]}
+            history_version += 1
+            append_history_log(event.file)
         return "Event received", 200
     else:
         return "Invalid data", 400
 
 
+@dataclass
+class Event:
+    """An event posted by the bot to /event."""
+    type: str
+    file: str
+    file_id: int
+    hash: str
+    forward_success: Optional[bool] = None
+    file_size: Optional[int] = None
+    processing_time: Optional[float] = None
+    upload_speed: Optional[float] = None
+
+
+# Accepted types of each Event field for the fallback decoder, matching msgspec: ints pass as floats, bools never as numbers
+EVENT_FIELD_TYPES = {
+    'type': (str,), 'file': (str,), 'file_id': (int,), 'hash': (str,),
+    'forward_success': (bool, type(None)), 'file_size': (int, type(None)),
+    'processing_time': (int, float, type(None)), 'upload_speed': (int, float, type(None)),
+}
+
+if msgspec is not None:
+    # Decode and validate /event bodies into an Event
+    event_decoders = {'application/msgpack': msgspec.msgpack.Decoder(Event), 'application/json': msgspec.json.Decoder(Event)}
+
+
+def get_event():
+    """Returns the body of an /event request as an Event, or None when it cannot be decoded, lacks fields or has mistyped ones."""
+    if msgspec is not None:
+        decoder = event_decoders.get(request.mimetype)
+        if decoder is None:
+            return None
+        try:
+            return decoder.decode(request.get_data(cache=False))
+        except msgspec.DecodeError:  # Also raised as msgspec.ValidationError for missing or mistyped fields
+            return None
+    data = get_payload()
+    if not isinstance(data, dict):
+        return None
+    values = {key: value for key, value in data.items() if key in EVENT_FIELD_TYPES}
+    for key, value in values.items():
+        accepted = EVENT_FIELD_TYPES[key]
+        if not isinstance(value, accepted) or (isinstance(value, bool) and bool not in accepted):
+            return None
+    try:
+        return Event(**values)
+    except TypeError:  # Missing required fields
+        return None
+
+
+def get_payload():
+    """Returns the decoded body of a bot request, sent as msgpack or JSON, or None when it cannot be decoded."""
+    if request.mimetype == 'application/msgpack':
+        if msgpack is None:
+            return None
+        try:
+            return msgpack.unpackb(request.get_data(cache=False), raw=False)
+        except ValueError:
+            return None
+    return request.get_json()
+
+
+def dumps_json(data):
+    """Serializes data to JSON bytes with orjson, or the json module when orjson is not installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data).encode()
+
+
+def schedule_file_history_save():
+    """Saves the file history HISTORY_SAVE_DELAY seconds after the first unsaved change, so bursts of events share one write."""
+    global history_save_timer
+    with history_save_lock:
+        if history_save_timer is None:
+            history_save_timer = threading.Timer(HISTORY_SAVE_DELAY, save_file_history)
+            history_save_timer.daemon = True
+            history_save_timer.start()
+
+
+def append_history_log(file_path):
+    """Appends the entry of file_path to the history log, scheduling a save once the log needs compacting."""
+    global history_log_entries
+    with history_save_lock:
+        history_log.write(dumps_json({'path': file_path, 'entry': file_history[file_path]}) + b'\n')
+        history_log.flush()
+        history_log_entries += 1
+        compact = history_log_entries >= HISTORY_COMPACT_ENTRIES
+    if compact:
+        schedule_file_history_save()
+
+
 def save_file_history():
-    """Saves the file history to a JSON file."""
-    with open('data/backend_file_history.json', 'w') as f:
-        json.dump(file_history, f)
-    logger.info("File history saved to data/backend_file_history.json")
+    """Saves the file history to a JSON file atomically, empties the history log and cancels any pending save."""
+    global history_save_timer, history_log_entries
+    with history_save_lock:
+        if history_save_timer is not None:
+            history_save_timer.cancel()
+            history_save_timer = None
+        snapshot = dict(file_history)  # Entries are replaced, never mutated, so a shallow copy is consistent
+        tmp_path = BACKEND_HISTORY_PATH + '.tmp'
+        with gzip.open(tmp_path, 'wb', compresslevel=1) as f:
+            f.write(dumps_json(snapshot))
+        os.replace(tmp_path, BACKEND_HISTORY_PATH)
+        history_log.truncate(0)
+        history_log_entries = 0
+    logger.info(f"File history saved to {BACKEND_HISTORY_PATH}")
 
 
 @app.route('/clear_logs', methods=['POST'])
@@ -177,14 +479,18 @@ def clear_logs():
     try:
         bot_log_path = os.path.join('logs', 'bot_log.txt')
         if os.path.exists(bot_log_path):
-            with open(bot_log_path, 'w') as f:
-                f.truncate(0)
+            os.truncate(bot_log_path, 0)
             logger.info(f"Cleared bot log file: {bot_log_path}")
 
         backend_log_path = os.path.join('logs', 'flask_backend_log.txt')
         if os.path.exists(backend_log_path):
-            with open(backend_log_path, 'w') as f:
-                f.truncate(0)
+            os.truncate(backend_log_path, 0)
+            # Keep the handler's stream position in step with the now empty file.
+            file_handler.acquire()
+            try:
+                file_handler.stream.seek(0)
+            finally:
+                file_handler.release()
             logger.info(f"Cleared backend log file: {backend_log_path}")
 
         return "Logs cleared successfully!"
@@ -196,27 +502,41 @@ def clear_logs():
 @app.route('/clear_json_data', methods=['POST'])
 def clear_json_data():
     """Clears all JSON data files, including bot history, backend history, and the file size cache."""
-    global file_history
+    global history_version, history_log_entries
     try:
         bot_json_path = 'data/bot_file_history.json'
         if os.path.exists(bot_json_path):
-            with open(bot_json_path, 'w') as f:
-                json.dump({}, f)
+            with open(bot_json_path, 'wb') as f:
+                f.write(b'{}')
             logger.info(f"Cleared bot JSON data file: {bot_json_path}")
 
-        backend_json_path = 'data/backend_file_history.json'
-        if os.path.exists(backend_json_path):
-            with open(backend_json_path, 'w') as f:
-                json.dump({}, f)
-            logger.info(f"Cleared backend JSON data file: {backend_json_path}")
+        bot_db_path = 'data/bot_file_history.db'
+        if os.path.exists(bot_db_path):
+            with sqlite3.connect(bot_db_path) as connection:
+                connection.execute("DELETE FROM files")
+                connection.execute("DELETE FROM meta")
+            connection.close()
+            logger.info(f"Cleared bot history database: {bot_db_path}")
+
+        for backend_json_path, opener in ((BACKEND_HISTORY_PATH, gzip.open), (LEGACY_BACKEND_HISTORY_PATH, open)):
+            if os.path.exists(backend_json_path):
+                with opener(backend_json_path, 'wb') as f:
+                    f.write(b'{}')
+                logger.info(f"Cleared backend JSON data file: {backend_json_path}")
+        with history_save_lock:
+            history_log.truncate(0)
+            history_log_entries = 0
 
         cache_path = 'data/file_size_cache.json'
         if os.path.exists(cache_path):
-            with open(cache_path, 'w') as f:
-                json.dump({}, f)
+            with open(cache_path, 'wb') as f:
+                f.write(b'{}')
             logger.info(f"Cleared file size cache: {cache_path}")
 
-        file_history = {}  # Clear the in-memory file history
+        file_history.clear()  # Clear the in-memory file history
+        history_version += 1
+        file_id_index.clear()
+        monitor_view.clear()
         return "JSON data cleared successfully!"
     except Exception as e:
         logger.error(f"Error clearing JSON data: {str(e)}")
@@ -273,8 +593,16 @@ def signal_handler(sig, frame):
     exit(0)
 
 
+if replayed_log_size:
+    save_file_history()  # Folds the replayed log into the snapshot and empties it, dropping any line torn by a crash
+
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    debug = os.environ.get('FLASK_DEBUG') == '1'
+    if serve is None or debug:
+        # Development server, with the debugger and reloader when FLASK_DEBUG=1
+        app.run(debug=debug)
+    else:
+        serve(app, host='127.0.0.1', port=5000, threads=SERVER_THREADS)